@@ -6,14 +6,18 @@ from pydantic import BaseModel
 from typing import List
 from core.bot_manager import BotManager
 from core.engine import TradingEngine 
+from core.log_queue import setup_queue_logging, stop_queue_logging
 from supabase import create_client, Client
 import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 from cachetools import TTLCache 
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI()
 
 app.add_middleware(
@@ -38,9 +42,14 @@ trading_engine = TradingEngine(bot_manager)
 
 @app.on_event("startup")
 async def startup_event():
-    print("🚀 Server Starting: Launching Monolith Engine...")
+    setup_queue_logging()
+    logger.info("🚀 Server Starting: Launching Monolith Engine...")
     asyncio.create_task(trading_engine.start())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    stop_queue_logging()
+
 class ConfigUpdate(BaseModel):
     symbol: str | None = None
     spread: float | None = None
@@ -77,15 +86,15 @@ async def read_index():
     return FileResponse('static/index.html')
 
 @app.get("/env")
-async def get_env():
+async def get_env() -> dict:
     return { "SUPABASE_URL": SUPABASE_URL, "SUPABASE_KEY": SUPABASE_KEY }
 
 @app.get("/config")
-async def get_config(bot = Depends(get_current_bot)):
+async def get_config(bot = Depends(get_current_bot)) -> dict:
     return bot.config
 
 @app.post("/config")
-async def update_config(config: ConfigUpdate, bot = Depends(get_current_bot)):
+async def update_config(config: ConfigUpdate, bot = Depends(get_current_bot)) -> bool:
     old_sym = bot.config.get('symbol')
     data = {k: v for k, v in config.model_dump().items() if v is not None}
     bot.config_manager.update_config(data)
@@ -94,15 +103,15 @@ async def update_config(config: ConfigUpdate, bot = Depends(get_current_bot)):
     return True
 
 @app.post("/control/start")
-async def start_bot(bot = Depends(get_current_bot)):
+async def start_bot(bot = Depends(get_current_bot)) -> dict:
     await bot.start()
     return {"status": "started"}
 
 @app.post("/control/stop")
-async def stop_bot(bot = Depends(get_current_bot)):
+async def stop_bot(bot = Depends(get_current_bot)) -> dict:
     await bot.stop()
     return {"status": "stopped"}
 
 @app.get("/status")
-async def get_status(bot = Depends(get_current_bot)):
+async def get_status(bot = Depends(get_current_bot)) -> dict:
     return bot.get_status()
\ No newline at end of file
@@ -1,8 +1,10 @@
-import uuid
+import logging
 from typing import Dict
 from core.config_manager import ConfigManager
 from core.strategy_engine import GridStrategy
 
+logger = logging.getLogger(__name__)
+
 class BotManager:
     def __init__(self):
         # Maps user_id -> GridStrategy
@@ -18,7 +20,7 @@ class BotManager:
             return self.bots[user_id]
         
         # 2. Re-initialize bot for this user (restores config from DB/File)
-        print(f"🔄 Restoring/Creating bot session for User: {user_id}")
+        logger.info("🔄 Restoring/Creating bot session for User: %s", user_id)
         config_manager = ConfigManager(user_id=user_id)
         
         # Initialize Strategy
@@ -38,7 +40,7 @@ class BotManager:
         bot = self.bots.get(user_id)
         if bot:
             await bot.stop()
-            print(f"Bot stopped for user: {user_id}")
+            logger.info("Bot stopped for user: %s", user_id)
 
     async def stop_all(self):
         for user_id in list(self.bots.keys()):
@@ -1,7 +1,11 @@
 import json
+import logging
 import os
+import time
 from typing import Dict, Any
 
+logger = logging.getLogger(__name__)
+
 class ConfigManager:
     def __init__(self, user_id: str = "default", config_file: str = "config.json"):
         self.user_id = user_id
@@ -13,6 +17,10 @@ class ConfigManager:
             self.config_file = config_file
             
         self.config: Dict[str, Any] = {}
+        self.version = 0 # Bumped on every mutation so readers can cache derived values
+        self.check_interval = 1.0 # Seconds between mtime checks for edits made on disk
+        self._next_check = 0.0
+        self._mtime_ns = None
         self.load_config()
 
     def load_config(self):
@@ -20,29 +28,58 @@ class ConfigManager:
             try:
                 with open(self.config_file, 'r') as f:
                     self.config = json.load(f)
-            except Exception as e:
-                print(f"⚠️ Error loading config {self.config_file}: {e}")
+            except (OSError, ValueError) as e:
+                if self.config:
+                    # Likely a half-saved edit: keep the last good config and leave
+                    # the mtime unrecorded so the next check retries the load
+                    logger.warning("⚠️ Error reloading config %s (keeping last good): %s", self.config_file, e)
+                    return
+                logger.warning("⚠️ Error loading config %s: %s", self.config_file, e)
                 self.config = self._get_defaults()
         else:
-            print(f"ℹ️ Creating new config file: {self.config_file}")
+            logger.info("ℹ️ Creating new config file: %s", self.config_file)
             self.config = self._get_defaults()
             self.save_config()
+        self._mtime_ns = self._stat_mtime()
+        self.version += 1
 
     def save_config(self):
         try:
             with open(self.config_file, 'w') as f:
                 json.dump(self.config, f, indent=4)
-        except Exception as e:
-            print(f"❌ Error saving config: {e}")
+            self._mtime_ns = self._stat_mtime() # our own write isn't an external edit
+        except (OSError, TypeError, ValueError) as e:
+            logger.error("❌ Error saving config: %s", e)
 
     def update_config(self, new_config: Dict[str, Any]):
         self.config.update(new_config)
+        self.version += 1
         self.save_config()
         return self.config
 
     def get_config(self):
         return self.config
 
+    def get_version(self) -> int:
+        """
+        Current config version. At most once per check_interval this also
+        stats the file and reloads it if it was edited on disk, so hand edits
+        still apply without a parse on every read.
+        """
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_interval
+            mtime_ns = self._stat_mtime()
+            if mtime_ns is not None and mtime_ns != self._mtime_ns:
+                self.load_config()
+        return self.version
+
+    def _stat_mtime(self):
+        try:
+            return os.stat(self.config_file).st_mtime_ns
+        except OSError:
+            return None
+
     def _get_defaults(self):
         return {
             "symbol": "FX Vol 20",
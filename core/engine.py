@@ -1,10 +1,22 @@
 import asyncio
+import logging
+import time
 import MetaTrader5 as mt5
 import os
+from typing import NamedTuple
 from dotenv import load_dotenv
+from core.symbols import ensure_symbol, reset_symbols
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+class Tick(NamedTuple):
+    """Tick snapshot handed to strategies (attribute access, no per-tick dict)."""
+    ask: float
+    bid: float
+    positions_count: int
+
 class TradingEngine:
     def __init__(self, bot_manager):
         self.bot_manager = bot_manager
@@ -15,59 +27,93 @@ class TradingEngine:
         self.password = os.getenv("MT5_PASSWORD", "")
         self.server = os.getenv("MT5_SERVER", "")
         self.path = os.getenv("MT5_PATH", "")
+        
+        # Positions only change on a new tick; re-poll at most this often otherwise
+        self.positions_poll_interval = 0.25
+        
+        # Unchanged quotes still reach the strategies this often, so their
+        # time-driven paths (close-all retry, runtime stop) keep running
+        self.dispatch_heartbeat = 0.25
+        
+        # Idle back-off: spin hot right after a tick, ease off while quiet.
+        # The cap bounds how late a new tick can be picked up, so keep it sub-ms
+        self.idle_sleep_step = 0.0001
+        self.idle_sleep_max = 0.0005
 
     async def start(self):
-        print("⚙️ Engine: Initializing Direct MT5 Connection (Monolith)...")
+        logger.info("⚙️ Engine: Initializing Direct MT5 Connection (Monolith)...")
         
         if not mt5.initialize(path=self.path):
-            print(f"❌ MT5 Init Failed: {mt5.last_error()}")
+            logger.error("❌ MT5 Init Failed: %s", mt5.last_error())
             return
             
         if not mt5.login(self.login, password=self.password, server=self.server):
-            print(f"❌ MT5 Login Failed: {mt5.last_error()}")
+            logger.error("❌ MT5 Login Failed: %s", mt5.last_error())
             return
             
-        print("✅ MT5 Connected. Starting High-Speed Loop.")
+        logger.info("✅ MT5 Connected. Starting High-Speed Loop.")
         await self.run_tick_loop()
 
     async def run_tick_loop(self):
         # We assume single-tenant or same-symbol for efficiency in this loop
         current_symbol = "FX Vol 20"
+        last_tick_msc = None
+        last_snapshot = None
+        pos_count = 0
+        next_pos_poll = 0.0
+        next_dispatch = 0.0
+        idle_spins = 0
         
         while self.running:
+            dispatched = False
             try:
                 # Dynamic Symbol from Strategy
                 bots = list(self.bot_manager.bots.values())
                 if bots:
-                    current_symbol = bots[0].config.get('symbol', current_symbol)
+                    symbol = bots[0].config.get('symbol', current_symbol)
+                    if symbol != current_symbol:
+                        current_symbol = symbol
+                        next_pos_poll = 0.0
                     
-                    # Ensure Symbol Selected
-                    mt5.symbol_select(current_symbol, True)
+                    # Ensure Symbol Selected (once per process, shared with the strategies)
+                    ensure_symbol(current_symbol)
                     
                     # Direct API Call - Zero Network Latency
                     tick = mt5.symbol_info_tick(current_symbol)
                     
                     if tick:
-                        # Direct Position Check
-                        positions = mt5.positions_get(symbol=current_symbol)
-                        pos_count = len(positions) if positions else 0
+                        # Direct Position Check (gated: only on a new tick or after the cooldown)
+                        now = time.monotonic()
+                        if tick.time_msc != last_tick_msc or now >= next_pos_poll:
+                            positions = mt5.positions_get(symbol=current_symbol)
+                            pos_count = len(positions) if positions else 0
+                            last_tick_msc = tick.time_msc
+                            next_pos_poll = now + self.positions_poll_interval
                         
-                        tick_data = {
-                            'ask': tick.ask, 
-                            'bid': tick.bid,
-                            'positions_count': pos_count
-                        }
+                        snapshot = Tick(tick.ask, tick.bid, pos_count)
                         
-                        # In-Memory Function Call
-                        await asyncio.gather(*[bot.on_external_tick(tick_data) for bot in bots])
+                        # In-Memory Function Call: one strategy pass per distinct snapshot
+                        # (plus a heartbeat), so spins that re-read the same quote don't
+                        # re-run the state machine
+                        if snapshot != last_snapshot or now >= next_dispatch:
+                            last_snapshot = snapshot
+                            next_dispatch = now + self.dispatch_heartbeat
+                            dispatched = True
+                            await asyncio.gather(*[bot.on_external_tick(snapshot) for bot in bots])
                         
             except Exception as e:
-                print(f"Engine Error: {e}")
+                logger.error("Engine Error: %s", e)
                 
-            # Zero Sleep for max performance
-            await asyncio.sleep(0)
+            # Zero sleep right after activity; adaptive back-off while the quote is idle
+            if dispatched:
+                idle_spins = 0
+                await asyncio.sleep(0)
+            else:
+                idle_spins += 1
+                await asyncio.sleep(min(idle_spins * self.idle_sleep_step, self.idle_sleep_max))
 
     async def stop(self):
         self.running = False
         mt5.shutdown()
-        print("🛑 MT5 Disconnected.")
\ No newline at end of file
+        reset_symbols()
+        logger.info("🛑 MT5 Disconnected.")
\ No newline at end of file
@@ -0,0 +1,53 @@
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+_listener = None
+
+class _SheddingQueueHandler(QueueHandler):
+    """Drops records when the queue is full instead of blocking or raising on the loop."""
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+class _BoundedQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # Blocking put: the listener thread keeps draining, so stop() can't hit Full
+        self.queue.put(self._sentinel)
+
+def setup_queue_logging(level=None, maxsize=10000):
+    """
+    Routes all log records through an in-memory queue. The event loop only
+    enqueues; a QueueListener thread does the actual (blocking) stream write,
+    so a slow stdout/pipe can't stall tick processing. The queue is bounded:
+    if the writer falls that far behind, new records are shed. Set GRID_DEBUG
+    in the environment to log at DEBUG.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    if level is None:
+        level = logging.DEBUG if os.getenv("GRID_DEBUG") else logging.INFO
+
+    log_queue = queue.Queue(maxsize=maxsize)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(_SheddingQueueHandler(log_queue))
+
+    _listener = _BoundedQueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def stop_queue_logging():
+    """Flushes pending records and stops the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
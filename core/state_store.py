@@ -0,0 +1,47 @@
+import asyncio
+import os
+import tempfile
+import orjson
+
+def write_state_file(path, state):
+    """
+    Writes state to its own temp file next to `path`, then renames it into
+    place, so a crash or an overlapping write never leaves a truncated file.
+    """
+    data = orjson.dumps(state) # serialise first: a bad snapshot never touches disk
+    f = tempfile.NamedTemporaryFile("wb", dir=os.path.dirname(os.path.abspath(path)),
+                                    prefix=os.path.basename(path) + ".", suffix=".tmp", delete=False)
+    try:
+        with f:
+            f.write(data)
+        os.replace(f.name, path)
+    except BaseException:
+        if os.path.exists(f.name): os.unlink(f.name)
+        raise
+
+class StateWriter:
+    """
+    Writes state snapshots from a worker thread, one at a time. Snapshots
+    requested while a write is in flight coalesce into one write of the
+    latest, and writes land in request order.
+    """
+    def __init__(self, path, spawn=asyncio.create_task):
+        self.path = path
+        self._spawn = spawn # lets the owner track the task (e.g. to drain it on stop)
+        self._pending = None # latest snapshot awaiting a write
+        self._task = None
+
+    def request(self, state):
+        self._pending = state
+        if self._task is None or self._task.done():
+            self._task = self._spawn(self._flush())
+
+    async def save(self, state):
+        """Queues state behind any in-flight write and waits until it has landed."""
+        self.request(state)
+        await self._task
+
+    async def _flush(self):
+        while self._pending is not None:
+            state, self._pending = self._pending, None
+            await asyncio.to_thread(write_state_file, self.path, state)
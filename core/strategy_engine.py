@@ -1,15 +1,69 @@
 import asyncio
+import logging
 import time
-import json
 import os
+from enum import IntEnum
+import orjson
 import MetaTrader5 as mt5
+from core.symbols import ensure_symbol
+from core.state_store import StateWriter
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "bot_state.json"
+INF = float("inf") # disarmed fire price: no ask reaches +inf, no bid reaches -inf
+
+class Level(IntEnum):
+    """Grid level a trigger is armed on."""
+    TOP = 1
+    CENTER = 2
+    BOTTOM = 3
+
+def _level_name(level):
+    return level.name.lower() if level is not None else None
+
+def _level_from_name(name):
+    return Level[name.upper()] if name else None
+
+def _cfg_num(c, key, default, cast=float):
+    """Coerces a numeric config value, falling back to the default on junk input."""
+    try:
+        return cast(c.get(key, default))
+    except (TypeError, ValueError):
+        logger.warning("⚠️ Invalid config value %s=%r, using %s", key, c.get(key), default)
+        return cast(default)
 
 class GridStrategy:
+    # Ping-pong transitions: (direction, source level) -> (next buy trigger, next sell trigger)
+    TRANSITIONS = {
+        ("buy", Level.TOP): (None, Level.CENTER),
+        ("buy", Level.CENTER): (None, Level.BOTTOM),
+        ("sell", Level.BOTTOM): (Level.CENTER, None),
+        ("sell", Level.CENTER): (Level.TOP, None),
+    }
+    # Anchor each armed trigger fires at: (direction, level) -> attribute name
+    TRIGGER_ANCHORS = {
+        ("buy", Level.TOP): "anchor_top_ask",
+        ("buy", Level.CENTER): "anchor_center_ask",
+        ("sell", Level.CENTER): "anchor_center_bid",
+        ("sell", Level.BOTTOM): "anchor_bottom_bid",
+    }
+
     def __init__(self, config_manager):
         self.config_manager = config_manager
         self.symbol = config_manager.get_config().get('symbol', 'FX Vol 20')
         self.running = False
         
+        # --- Config Snapshot (refreshed only when the config version changes) ---
+        self._config_version = -1
+        self._max_runtime_secs = 0
+        self._time_up = False # flipped by the runtime timer, so ticks don't do the arithmetic
+        self._runtime_handle = None
+        self._refresh_config()
+        self._order_templates = {}
+        self._fire_templates = None # Per-side templates with the locked SL/TP baked in
+        self._build_order_templates()
+        
         # --- IMMUTABLE GRID ANCHORS ---
         self.anchor_center_bid = None 
         self.anchor_center_ask = None
@@ -17,84 +71,168 @@ class GridStrategy:
         self.anchor_bottom_bid = None
         
         # --- State Memory ---
-        self.buy_trigger_name = None   
-        self.sell_trigger_name = None
+        self.buy_trigger = None   # Level or None
+        self.sell_trigger = None
+        self._buy_at = INF # Price the armed buy trigger fires at (ask >=), resolved on arm
+        self._sell_at = -INF # Price the armed sell trigger fires at (bid <=)
         
         # --- Corridor Memory (The new SL/TP Logic) ---
         self.active_upper_level = None # Fixed Upper Price (Sell SL / Buy TP)
         self.active_lower_level = None # Fixed Lower Price (Sell TP / Buy SL)
         
-        # --- Pre-Calculation Slot (Zero Lag) ---
-        self.next_trade_plan = None 
+        # --- Pre-Formatted Log Labels ---
+        self._fire_labels = {} # (direction, Level) -> pre-formatted log label
         
         # --- General State ---
         self.current_step = 0
         self.iteration = 1
         self.is_resetting = False 
-        self.reset_timestamp = 0
+        self.close_retry_at = 0.0 # monotonic deadline for the next close_all retry
+        self.close_min_interval = 1.0 # seconds between close_all retries
+        self._last_close_at = 0.0
+        self._close_task = None
+        self._close_symbol = None # symbol the latest close_all was launched for
         self.is_busy = False 
+        self._state_lock = asyncio.Lock() # held by an in-flight fire; resets wait it out
+        self._bg_tasks = set() # strong refs until done, so tasks aren't GC'd mid-flight
+        self.stop_drain_timeout = 5.0 # seconds stop() waits for in-flight tasks
+        self._state_writer = StateWriter(STATE_FILE, self._spawn)
         
         # --- UI Data ---
         self.current_price = 0.0
         self.open_positions = 0 
-        self.start_time = 0
+        self.start_time = 0 # time.monotonic() at start()
         self.last_pos_count = 0
         
         self.load_state()
 
     @property
     def config(self):
-        self.config_manager.load_config()
         return self.config_manager.get_config()
 
+    def _refresh_config(self):
+        """Flattens the hot config keys into attributes whenever the config changes."""
+        version = self.config_manager.get_version()
+        if version == self._config_version: return
+        c = self.config_manager.get_config()
+        self._cfg_symbol = c.get('symbol')
+        self._spread = _cfg_num(c, 'spread', 6.0)
+        try:
+            self._step_lots = tuple(float(lot) for lot in c.get('step_lots') or ())
+        except (TypeError, ValueError):
+            logger.warning("⚠️ Invalid config value step_lots=%r, using 0.01", c.get('step_lots'))
+            self._step_lots = ()
+        self._last_vol = self._step_lots[-1] if self._step_lots else 0.01
+        self._max_positions = _cfg_num(c, 'max_positions', 5, int)
+        self._step_comments = tuple(f"S{step}" for step in range(max(self._max_positions, 0)))
+        # One lot per reachable step (short lists padded with the last lot)
+        pad = self._max_positions - len(self._step_lots)
+        self._step_vols = self._step_lots + (self._last_vol,) * max(pad, 0)
+        max_runtime_secs = _cfg_num(c, 'max_runtime_minutes', 0, int) * 60
+        if max_runtime_secs != self._max_runtime_secs:
+            self._max_runtime_secs = max_runtime_secs
+            if self.running: self._arm_runtime_timer()
+        # Corridor offsets per side as (above entry, below entry):
+        # Buy -> TP above / SL below, Sell -> SL above / TP below
+        self._corridor_offsets = {
+            "buy": (_cfg_num(c, 'buy_stop_tp', 0), _cfg_num(c, 'buy_stop_sl', 0)),
+            "sell": (_cfg_num(c, 'sell_stop_sl', 0), _cfg_num(c, 'sell_stop_tp', 0)),
+        }
+        self._config_version = version
+
+    def _build_order_templates(self):
+        """Static part of the market-order request per side; rebuilt when the symbol changes."""
+        common = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": self.symbol,
+            "type_time": mt5.ORDER_TIME_GTC,
+            "type_filling": mt5.ORDER_FILLING_FOK,
+            "deviation": 50
+        }
+        self._order_templates = {
+            "buy": {**common, "type": mt5.ORDER_TYPE_BUY},
+            "sell": {**common, "type": mt5.ORDER_TYPE_SELL},
+        }
+        self._fire_templates = None
+
+    def _build_fire_templates(self):
+        """Bakes the locked corridor into the order templates; valid until the next reset."""
+        upper = self.active_upper_level
+        lower = self.active_lower_level
+        templates = self._order_templates
+        self._fire_templates = {
+            "buy": {**templates["buy"], "tp": upper, "sl": lower},
+            "sell": {**templates["sell"], "sl": upper, "tp": lower},
+        }
+        return self._fire_templates
+
     async def start_ticker(self):
-        print("🔄 Config Change: Forcing Grid Reset...")
+        logger.info("🔄 Config Change: Forcing Grid Reset...")
+        self._refresh_config()
         self.is_resetting = True
-        self.reset_timestamp = time.time()
+        self.close_retry_at = time.monotonic() + 2.0
 
     async def start(self):
         self.running = True
-        self.start_time = time.time()
+        self.start_time = time.monotonic()
+        self._arm_runtime_timer()
         
         # Ensure symbol is selected
-        self.symbol = self.config.get('symbol', 'FX Vol 20')
-        mt5.symbol_select(self.symbol, True)
-        
-        self.cancel_all_orders_direct()
+        self._refresh_config()
+        self.symbol = self._cfg_symbol or 'FX Vol 20'
+        self._build_order_templates()
+        ensure_symbol(self.symbol)
         
-        real_positions = self.get_real_positions_count()
+        # Independent terminal round-trips: overlap them off the event loop
+        _, real_positions = await asyncio.gather(
+            asyncio.to_thread(self.cancel_all_orders_direct),
+            asyncio.to_thread(self.get_real_positions_count),
+        )
         if real_positions == 0:
             self.reset_cycle()
         else:
-            print(f"⚠️ Resuming existing cycle ({real_positions} positions)...")
+            logger.warning("⚠️ Resuming existing cycle (%s positions)...", real_positions)
             self.last_pos_count = real_positions
-            # Attempt to reconstruct next move if we crashed
-            self.precalc_next_trade()
 
-        print(f"✅ Monolith Strategy Started: {self.symbol}")
+        logger.info("✅ Monolith Strategy Started: %s", self.symbol)
 
     async def stop(self):
+        """Stops and saves once in-flight work settles (BotManager/API; the tick path uses _halt)."""
+        self._halt()
+        await self._drain_and_save()
+
+    def _halt(self):
         self.running = False
-        self.save_state()
+        if self._runtime_handle: self._runtime_handle.cancel()
+
+    async def _drain_and_save(self):
+        # Let an in-flight fill/close settle so the saved state reflects it
+        # (bounded: MT5 calls run in threads and can't be cancelled)
+        pending = self._bg_tasks - {asyncio.current_task()}
+        if pending:
+            await asyncio.wait(pending, timeout=self.stop_drain_timeout)
+        await self.save_state()
 
     def get_real_positions_count(self):
         positions = mt5.positions_get(symbol=self.symbol)
         return len(positions) if positions else 0
 
-    def cancel_all_orders_direct(self):
-        orders = mt5.orders_get(symbol=self.symbol)
+    def cancel_all_orders_direct(self, symbol=None):
+        orders = mt5.orders_get(symbol=symbol or self.symbol)
         if orders:
             for order in orders:
                 mt5.order_send({"action": mt5.TRADE_ACTION_REMOVE, "order": order.ticket})
 
-    def close_all_direct(self):
-        self.cancel_all_orders_direct()
-        positions = mt5.positions_get(symbol=self.symbol)
+    def close_all_direct(self, symbol=None):
+        symbol = symbol or self.symbol
+        self.cancel_all_orders_direct(symbol)
+        positions = mt5.positions_get(symbol=symbol)
         if positions:
+            # One quote for the whole batch (same symbol); deviation absorbs drift
+            tick = mt5.symbol_info_tick(symbol)
+            if not tick: return
             for pos in positions:
                 type_op = mt5.ORDER_TYPE_SELL if pos.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
-                tick = mt5.symbol_info_tick(self.symbol)
-                if not tick: continue
                 price = tick.bid if type_op == mt5.ORDER_TYPE_SELL else tick.ask
                 mt5.order_send({
                     "action": mt5.TRADE_ACTION_DEAL,
@@ -106,113 +244,74 @@ class GridStrategy:
                     "deviation": 50
                 })
 
+    def _spawn(self, coro):
+        """Starts a background task, keeps a reference until it finishes and logs its failure."""
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._on_bg_task_done)
+        return task
+
+    def _on_bg_task_done(self, task):
+        self._bg_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Background task failed: %s", task.exception())
+
+    def close_all_background(self, retry=False):
+        """
+        Runs close_all_direct in a worker thread so the tick loop keeps draining
+        while MT5 works through the positions. At most one close per symbol is
+        in flight; a close for another symbol (a symbol switch) queues behind
+        it. Retries are held to one per close_min_interval.
+        """
+        now = time.monotonic()
+        if retry and now - self._last_close_at < self.close_min_interval: return
+        in_flight = self._close_task if self._close_task and not self._close_task.done() else None
+        if in_flight and self._close_symbol == self.symbol: return
+        self._last_close_at = now
+        self._close_symbol = self.symbol
+        self._close_task = self._spawn(self._close_after(in_flight, self.symbol))
+        self.close_retry_at = now + 2.0
+
+    async def _close_after(self, previous, symbol):
+        if previous: await asyncio.wait({previous}) # its failure is logged by _spawn
+        await asyncio.to_thread(self.close_all_direct, symbol)
+
     def reset_cycle(self):
         self.anchor_center_bid = None
         self.anchor_top_ask = None
         self.anchor_bottom_bid = None
-        self.buy_trigger_name = None
-        self.sell_trigger_name = None
+        self._set_triggers(None, None)
         self.active_upper_level = None
         self.active_lower_level = None
-        self.next_trade_plan = None
+        self._fire_templates = None
         self.current_step = 0
         self.is_resetting = False
         self.is_busy = False 
-        self.save_state()
-        print(f"🔄 Cycle Reset: Waiting for new Anchor (Iteration {self.iteration})...")
-
-    async def on_external_tick(self, tick_data):
-        if not self.running: return
-
-        # 1. Symbol Check
-        cfg_symbol = self.config.get('symbol')
-        if cfg_symbol and cfg_symbol != self.symbol:
-            self.close_all_direct()
-            self.symbol = cfg_symbol
-            mt5.symbol_select(self.symbol, True)
-            self.is_resetting = True
+        self.request_save()
+        logger.info("🔄 Cycle Reset: Waiting for new Anchor (Iteration %s)...", self.iteration)
+
+    def _arm_runtime_timer(self):
+        """(Re)schedules the max-runtime deadline relative to start_time; 0 disables it."""
+        if self._runtime_handle: self._runtime_handle.cancel()
+        self._runtime_handle = None
+        self._time_up = False
+        max_secs = self._max_runtime_secs
+        if not max_secs: return
+        remaining = self.start_time + max_secs - time.monotonic()
+        if remaining <= 0:
+            self._time_up = True
             return
+        self._runtime_handle = asyncio.get_running_loop().call_later(remaining, self._mark_time_up)
 
-        ask = float(tick_data['ask'])
-        bid = float(tick_data['bid'])
-        self.current_price = ask 
-        
-        # 2. Critical Safety Check
-        self.open_positions = tick_data.get('positions_count', 0)
-        if self.open_positions < self.last_pos_count and not self.is_resetting and self.current_step > 0:
-            print(f"🚨 POSITION DROP ({self.last_pos_count}->{self.open_positions}). NUCLEAR RESET.")
-            self.close_all_direct()
-            self.is_resetting = True
-            self.reset_timestamp = time.time()
-            self.last_pos_count = self.open_positions
-            return
-        
-        self.last_pos_count = self.open_positions
-
-        # 3. Reset Handler
-        if self.is_resetting:
-            if self.open_positions == 0:
-                if self.is_time_up():
-                    await self.stop()
-                    return
-                print("✅ Account Cleaned. Starting New Iteration.")
-                self.iteration += 1
-                self.reset_cycle()
-            else:
-                if time.time() - self.reset_timestamp > 2:
-                    self.close_all_direct()
-                    self.reset_timestamp = time.time()
-            return
-
-        # 4. Initialization
-        if self.anchor_center_bid is None:
-            self.init_immutable_grid(ask, bid)
-            return
-
-        # 5. Limits
-        max_pos = int(self.config.get('max_positions', 5))
-        if self.current_step >= max_pos: return 
-        if self.is_time_up(): return
-        if self.is_busy: return 
-
-        # --- 6. ZERO-LAG EXECUTION (Pre-Calculated) ---
-        if self.next_trade_plan:
-            plan = self.next_trade_plan
-            trigger_hit = False
-            
-            # Check Trigger Condition
-            if plan['trigger_type'] == 'ask_ge' and ask >= plan['trigger_price']:
-                trigger_hit = True
-            elif plan['trigger_type'] == 'bid_le' and bid <= plan['trigger_price']:
-                trigger_hit = True
-                
-            if trigger_hit:
-                print(f"⚡ SNIPER: Trigger Hit {plan['trigger_price']}. Firing Pre-Calc...")
-                self.is_busy = True
-                
-                # FINAL PARAMETER INJECTION (Get latest price for market order)
-                req = plan['request']
-                req['price'] = ask if req['type'] == mt5.ORDER_TYPE_BUY else bid
-                
-                # EXECUTE DIRECTLY
-                res = mt5.order_send(req)
-                
-                if res.retcode == mt5.TRADE_RETCODE_DONE:
-                    print(f"🚀 ORDER FILLED: {req['type']} @ {req['price']}")
-                    self.current_step += 1
-                    self.update_state_post_trade(plan['direction'], plan['source'])
-                else:
-                    print(f"❌ Order Failed: {res.comment}")
-                
-                self.is_busy = False
+    def _mark_time_up(self):
+        self._runtime_handle = None
+        self._time_up = True
 
     def is_time_up(self):
-        max_mins = int(self.config.get('max_runtime_minutes', 0))
-        if max_mins == 0: return False
-        return (time.time() - self.start_time) / 60 > max_mins
+        return self._time_up
 
     def init_immutable_grid(self, ask, bid):
-        user_spread = float(self.config.get('spread', 6.0))
+        user_spread = self._spread
         broker_spread = ask - bid
         offset = max(user_spread - broker_spread, 0.1)
         
@@ -221,79 +320,37 @@ class GridStrategy:
         self.anchor_top_ask = ask + offset
         self.anchor_bottom_bid = bid - offset
         
-        self.buy_trigger_name = "top"
-        self.sell_trigger_name = "bottom"
+        self._set_triggers(Level.TOP, Level.BOTTOM)
+        self.build_fire_labels()
         
-        print(f"⚓ ANCHOR SET. Top: {self.anchor_top_ask:.5f} | Bot: {self.anchor_bottom_bid:.5f}")
-        self.precalc_next_trade() # Prepare the first shot
-        self.save_state()
+        labels = self._fire_labels
+        logger.info("⚓ ANCHOR SET. Top: %s | Bot: %s", labels[('buy', Level.TOP)], labels[('sell', Level.BOTTOM)])
+        self.request_save()
+
+    def build_fire_labels(self):
+        """Formats the anchor prices once per grid so fire logs don't re-format floats."""
+        self._fire_labels = {
+            ("buy", Level.TOP): f"{self.anchor_top_ask:.5f}",
+            ("buy", Level.CENTER): f"{self.anchor_center_ask:.5f}",
+            ("sell", Level.CENTER): f"{self.anchor_center_bid:.5f}",
+            ("sell", Level.BOTTOM): f"{self.anchor_bottom_bid:.5f}",
+        }
 
-    def precalc_next_trade(self):
-        """
-        Calculates the NEXT trade parameters and stores them in memory.
-        This removes calculation time from the tick loop.
-        """
-        self.next_trade_plan = None
-        
-        # Determine Trigger and Direction
-        direction = None
-        trigger_price = 0.0
-        trigger_type = ""
-        source = ""
-        
-        if self.buy_trigger_name == "top":
-            direction = "buy"
-            trigger_price = self.anchor_top_ask
-            trigger_type = "ask_ge"
-            source = "top"
-        elif self.buy_trigger_name == "center":
-            direction = "buy"
-            trigger_price = self.anchor_center_ask
-            trigger_type = "ask_ge"
-            source = "center"
-        
-        # If no buy trigger, check sell trigger (simplified for mutually exclusive logic)
-        # Note: Ideally we check both, but for pre-calc we prioritize or need a list.
-        # For simplicity in this architecture, we check both conditions in tick loop if needed,
-        # but here we'll assume the state machine sets one or two. 
-        # Actually, we need to handle dual triggers at start.
-        # UPDATE: Since start has 2 triggers, we can't pre-calc just one perfectly unless we assume
-        # we pre-calc BOTH and fire the one that hits. 
-        # For this implementation, we will pre-calc the "Buy" scenario if active, else "Sell".
-        # If BOTH are active (start), we pre-calc both? 
-        # Let's keep it robust: We will calculate the *parameters* for both, but triggering needs logic.
-        
-        # REVISION: We will calculate a list of plans.
-        # But wait, execute_market_order blocks.
-        # Let's stick to the main loop checking triggers and just having the REQUEST payload ready.
-        pass # We will do this dynamically in a helper called by on_external_tick for now to ensure dual triggers work.
-        
-        # Actually, let's restructure:
-        # We need `prepare_request(direction)`
-    
     def update_state_post_trade(self, direction, source):
-        # 1. Update Transition Logic
-        if direction == "buy":
-            if source == "top":
-                self.sell_trigger_name = "center"
-                self.buy_trigger_name = None 
-            elif source == "center":
-                self.sell_trigger_name = "bottom"
-                self.buy_trigger_name = None
-        elif direction == "sell":
-            if source == "bottom":
-                self.buy_trigger_name = "center"
-                self.sell_trigger_name = None
-            elif source == "center":
-                self.buy_trigger_name = "top"
-                self.sell_trigger_name = None
-        
-        self.precalc_next_trade() # Recalculate for next step
-        self.save_state()
-
-    # --- REPLACING execute_market_order with Pre-Calc Logic ---
-    # The actual execution happens in on_external_tick now.
-    # We need a helper to build the request quickly.
+        # 1. Update Transition Logic (single table lookup)
+        self._set_triggers(*self.TRANSITIONS[(direction, source)])
+        self.request_save()
+
+    def _set_triggers(self, buy, sell):
+        """Arms the triggers and resolves the price each fires at, so ticks compare one float per side."""
+        self.buy_trigger = buy
+        self.sell_trigger = sell
+        anchors = self.TRIGGER_ANCHORS
+        buy_at = getattr(self, anchors[("buy", buy)]) if buy is not None else None
+        sell_at = getattr(self, anchors[("sell", sell)]) if sell is not None else None
+        # Disarmed (or anchor missing) sides get a sentinel the tick compare never crosses
+        self._buy_at = INF if buy_at is None else buy_at
+        self._sell_at = -INF if sell_at is None else sell_at
 
     def get_trade_params(self, direction, current_price):
         """Generates the SL/TP and Volume for a trade."""
@@ -308,182 +365,177 @@ class GridStrategy:
         
         if upper is None or lower is None:
             # First Trade - Calculate and Lock
-            symbol_info = mt5.symbol_info(self.symbol)
-            point = symbol_info.point
-            min_dist = (symbol_info.trade_stops_level * point) + (5 * point)
-            
-            sl_cfg = float(self.config.get(f'{direction}_stop_sl', 0))
-            tp_cfg = float(self.config.get(f'{direction}_stop_tp', 0))
-            
-            # Convert pips to price distance (Assuming 1 pip = 1.0 or 0.01 depending on asset)
-            # Vol 20 is usually 2 decimals. 
-            
-            if direction == "buy":
-                # Buy: TP is Higher (Upper), SL is Lower (Lower)
-                upper = current_price + tp_cfg
-                lower = current_price - sl_cfg
-            else:
-                # Sell: SL is Higher (Upper), TP is Lower (Lower)
-                upper = current_price + sl_cfg
-                lower = current_price - tp_cfg
+            # Config distances are already in price units (Vol 20 is usually 2 decimals),
+            # so the offsets come straight from the config snapshot.
+            above, below = self._corridor_offsets[direction]
+            upper = current_price + above
+            lower = current_price - below
             
             # LOCK THEM
             self.active_upper_level = upper
             self.active_lower_level = lower
-            print(f"🔒 CORRIDOR LOCKED: Upper={upper:.2f}, Lower={lower:.2f}")
-
-        # Assign based on direction
-        if direction == "buy":
-            tp = upper
-            sl = lower
-            type_op = mt5.ORDER_TYPE_BUY
-        else:
-            sl = upper
-            tp = lower
-            type_op = mt5.ORDER_TYPE_SELL
-            
-        return {
-            "action": mt5.TRADE_ACTION_DEAL,
-            "symbol": self.symbol,
-            "volume": float(vol),
-            "type": type_op,
-            "sl": sl,
-            "tp": tp,
-            "magic": self.iteration,
-            "comment": f"S{self.current_step}",
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_FOK,
-            "deviation": 50
-        }
-
-    # Redefine on_external_tick to call get_trade_params immediately
-    async def on_external_tick(self, tick_data):
+            logger.info("🔒 CORRIDOR LOCKED: Upper=%.2f, Lower=%.2f", upper, lower)
+
+        # SL/TP are fixed for the cycle, so only the per-fire fields are filled here
+        # (copied, the request may outlive this call)
+        templates = self._fire_templates or self._build_fire_templates()
+        req = templates[direction].copy()
+        req["volume"] = vol
+        req["magic"] = self.iteration
+        step = self.current_step
+        comments = self._step_comments
+        req["comment"] = comments[step] if step < len(comments) else f"S{step}"
+        return req
+
+    async def on_external_tick(self, tick):
         if not self.running: return
-        
-        # ... (Reset Logic from above) ...
-        # (Copy the Reset/Symbol check code from the start of the previous on_external_tick block)
-        # ...
-        
-        # Check Symbol
-        cfg_symbol = self.config.get('symbol')
+        self._refresh_config()
+
+        # 1. Symbol Check
+        cfg_symbol = self._cfg_symbol
         if cfg_symbol and cfg_symbol != self.symbol:
-            self.close_all_direct()
+            self.close_all_background()
             self.symbol = cfg_symbol
-            mt5.symbol_select(self.symbol, True)
+            self._build_order_templates()
+            ensure_symbol(self.symbol)
             self.is_resetting = True
             return
 
-        ask = float(tick_data['ask'])
-        bid = float(tick_data['bid'])
-        self.open_positions = tick_data.get('positions_count', 0)
+        # Tick fields arrive typed (floats/int from the engine), so just unpack
+        ask, bid, positions = tick
+        self.current_price = ask 
         
-        # Nuclear Reset
-        if self.open_positions < self.last_pos_count and not self.is_resetting and self.current_step > 0:
-            self.close_all_direct()
+        # 2. Critical Safety Check
+        last_pos_count = self.last_pos_count
+        self.open_positions = self.last_pos_count = positions
+        if positions < last_pos_count and not self.is_resetting and self.current_step > 0:
+            logger.warning("🚨 POSITION DROP (%s->%s). NUCLEAR RESET.", last_pos_count, positions)
+            self.close_all_background()
             self.is_resetting = True
-            self.reset_timestamp = time.time()
-            self.last_pos_count = self.open_positions
             return
-        self.last_pos_count = self.open_positions
 
+        # 3. Reset Handler
         if self.is_resetting:
-            if self.open_positions == 0:
-                if self.is_time_up(): await self.stop(); return
+            if positions == 0:
+                # An order still settling could land in the fresh cycle; reset on a later tick
+                if self._state_lock.locked(): return
+                if self.is_time_up():
+                    # Drain in the background: awaiting it here would hold every
+                    # bot's tick in the engine's gather for up to stop_drain_timeout
+                    self._halt()
+                    self._spawn(self._drain_and_save())
+                    return
+                logger.info("✅ Account Cleaned. Starting New Iteration.")
                 self.iteration += 1
                 self.reset_cycle()
-            elif time.time() - self.reset_timestamp > 2:
-                self.close_all_direct()
-                self.reset_timestamp = time.time()
+            elif time.monotonic() >= self.close_retry_at:
+                self.close_all_background(retry=True)
             return
 
+        # 4. Initialization
         if self.anchor_center_bid is None:
             self.init_immutable_grid(ask, bid)
             return
 
-        if self.current_step >= int(self.config.get('max_positions', 5)): return
-        if self.is_busy: return
+        # 5. Limits
+        if self.is_busy or self.current_step >= self._max_positions: return
+        if self.is_time_up(): return
+
+        # --- 6. REAL-TIME EXECUTION ---
+        # The request is built JIT from local state (no network hop), < 0.1ms.
+        # Fire prices were resolved when the triggers were armed.
+        if ask >= self._buy_at:
+            return self._fire_trigger("buy", self.buy_trigger, ask)
 
-        # --- REAL-TIME EXECUTION ---
-        # We calculate request JIT (Just-In-Time) but using local CPU, no HTTP.
-        # This is < 0.1ms.
-        
-        triggered_direction = None
-        triggered_source = None
-        execution_price = 0.0
-        
-        # Check Buy Triggers
-        if self.buy_trigger_name == "top" and ask >= self.anchor_top_ask:
-            triggered_direction = "buy"; triggered_source = "top"; execution_price = ask
-        elif self.buy_trigger_name == "center" and ask >= self.anchor_center_ask:
-            triggered_direction = "buy"; triggered_source = "center"; execution_price = ask
-            
         # Check Sell Triggers (if not bought)
-        if not triggered_direction:
-            if self.sell_trigger_name == "bottom" and bid <= self.anchor_bottom_bid:
-                triggered_direction = "sell"; triggered_source = "bottom"; execution_price = bid
-            elif self.sell_trigger_name == "center" and bid <= self.anchor_center_bid:
-                triggered_direction = "sell"; triggered_source = "center"; execution_price = bid
+        if bid <= self._sell_at:
+            self._fire_trigger("sell", self.sell_trigger, bid)
+
+    def _fire_trigger(self, direction, source, execution_price):
+        self.is_busy = True
+        label = self._fire_labels.get((direction, source), "")
+        logger.info("⚡ SNIPER: %s Hit %s (%s). Firing...", direction.upper(), source.name, label)
         
-        if triggered_direction:
-            self.is_busy = True
-            print(f"⚡ SNIPER: {triggered_direction.upper()} Hit. Firing...")
-            
-            # Prepare Request (Monolith)
-            req = self.get_trade_params(triggered_direction, execution_price)
-            req['price'] = execution_price # Update with exact tick price
-            
-            # Execute
-            res = mt5.order_send(req)
-            
-            if res.retcode == mt5.TRADE_RETCODE_DONE:
-                print(f"🚀 FILLED: {res.price}")
-                self.current_step += 1
-                self.update_state_post_trade(triggered_direction, triggered_source)
-            else:
-                print(f"❌ Order Failed: {res.comment}")
-                
-            self.is_busy = False
+        # Prepare Request (Monolith)
+        req = self.get_trade_params(direction, execution_price)
+        req['price'] = execution_price # Update with exact tick price
+        
+        # Execute off the tick path; is_busy keeps further triggers out until it settles
+        self._spawn(self._fire(req, direction, source))
+
+    async def _fire(self, req, direction, source):
+        """Sends the order in a worker thread; state only advances on a confirmed fill."""
+        iteration = self.iteration
+        async with self._state_lock:
+            try:
+                # Straight to the default executor: to_thread would also copy the
+                # contextvars context and wrap a partial, neither of which order_send needs
+                res = await asyncio.get_running_loop().run_in_executor(None, mt5.order_send, req)
+                if res is not None and res.retcode == mt5.TRADE_RETCODE_DONE:
+                    logger.info("🚀 FILLED: %s", res.price)
+                    if self.is_resetting or self.iteration != iteration:
+                        return # Cycle was torn down while the order was in flight
+                    self.current_step += 1
+                    self.update_state_post_trade(direction, source)
+                else:
+                    logger.error("❌ Order Failed: %s", res.comment if res else 'no result')
+            except Exception as e:
+                logger.error("❌ Order Failed: %s", e)
+            finally:
+                self.is_busy = False
 
     def get_volume(self, step):
-        step_lots = self.config.get('step_lots', [])
-        if not step_lots: return 0.01
-        if step < len(step_lots): return step_lots[step]
-        return step_lots[-1]
+        try:
+            return self._step_vols[step]
+        except IndexError: # only past max_positions, which the limit check prevents
+            return self._last_vol
 
-    def save_state(self):
-        state = {
+    def _state_snapshot(self):
+        return {
             "symbol": self.symbol,
             "anchor_center_ask": self.anchor_center_ask,
             "anchor_center_bid": self.anchor_center_bid,
             "anchor_top_ask": self.anchor_top_ask,
             "anchor_bottom_bid": self.anchor_bottom_bid,
-            "buy_trigger_name": self.buy_trigger_name,
-            "sell_trigger_name": self.sell_trigger_name,
+            "buy_trigger_name": _level_name(self.buy_trigger),
+            "sell_trigger_name": _level_name(self.sell_trigger),
             "active_upper_level": self.active_upper_level,
             "active_lower_level": self.active_lower_level,
             "current_step": self.current_step,
             "iteration": self.iteration
         }
-        with open("bot_state.json", "w") as f:
-            json.dump(state, f)
+
+    async def save_state(self):
+        """Persists state and waits until it has landed (used on stop)."""
+        await self._state_writer.save(self._state_snapshot())
+
+    def request_save(self):
+        """Snapshots state now and writes it in the background (coalesced, see StateWriter)."""
+        self._state_writer.request(self._state_snapshot())
 
     def load_state(self):
-        if os.path.exists("bot_state.json"):
+        if os.path.exists(STATE_FILE):
             try:
-                with open("bot_state.json", "r") as f:
-                    state = json.load(f)
+                with open(STATE_FILE, "rb") as f:
+                    state = orjson.loads(f.read())
                     if state.get("symbol") == self.symbol:
                         self.anchor_center_ask = state.get("anchor_center_ask")
                         self.anchor_center_bid = state.get("anchor_center_bid")
                         self.anchor_top_ask = state.get("anchor_top_ask")
                         self.anchor_bottom_bid = state.get("anchor_bottom_bid")
-                        self.buy_trigger_name = state.get("buy_trigger_name")
-                        self.sell_trigger_name = state.get("sell_trigger_name")
+                        self._set_triggers(
+                            _level_from_name(state.get("buy_trigger_name")),
+                            _level_from_name(state.get("sell_trigger_name")),
+                        )
                         self.active_upper_level = state.get("active_upper_level")
                         self.active_lower_level = state.get("active_lower_level")
                         self.current_step = state.get("current_step", 0)
                         self.iteration = state.get("iteration", 1)
-            except: pass
+                        if self.anchor_center_bid is not None:
+                            self.build_fire_labels()
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                # Unreadable/corrupt state: start from a clean grid rather than crash
+                logger.warning("⚠️ Ignoring saved state: %s", e)
 
     def get_status(self):
         return {
@@ -494,6 +546,6 @@ class GridStrategy:
             "iteration": self.iteration,
             "is_resetting": self.is_resetting,
             "anchor": self.anchor_center_ask, 
-            "next_buy": self.buy_trigger_name,
-            "next_sell": self.sell_trigger_name
+            "next_buy": _level_name(self.buy_trigger),
+            "next_sell": _level_name(self.sell_trigger)
         }
\ No newline at end of file
@@ -0,0 +1,20 @@
+import MetaTrader5 as mt5
+
+_selected = set()
+
+def ensure_symbol(symbol):
+    """
+    Adds a symbol to Market Watch once per process. The terminal connection
+    is shared by every strategy and the engine loop, so a symbol selected by
+    one of them is visible to all; repeat calls are a set lookup, not IPC.
+    """
+    if symbol in _selected:
+        return True
+    if mt5.symbol_select(symbol, True):
+        _selected.add(symbol)
+        return True
+    return False
+
+def reset_symbols():
+    """Forgets selected symbols (call when the terminal connection is closed)."""
+    _selected.clear()
@@ -1,21 +1,35 @@
 import MetaTrader5 as mt5
 import uvicorn
-from fastapi import FastAPI, HTTPException
+import asyncio
+import orjson
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import os
+import time
 from dotenv import load_dotenv
-from contextlib import asynccontextmanager
-import traceback
+from contextlib import aclosing, asynccontextmanager
+import logging
+from core.log_queue import setup_queue_logging, stop_queue_logging
 
 load_dotenv()
 
+logger = logging.getLogger("mt5_bridge")
+
 # Configuration
 LOGIN = int(os.getenv("MT5_LOGIN", 0))
 PASSWORD = os.getenv("MT5_PASSWORD", "")
 SERVER = os.getenv("MT5_SERVER", "")
 PATH = os.getenv("MT5_PATH", "")
 BRIDGE_PORT = int(os.getenv("BRIDGE_PORT", 8001))
+KEEP_ALIVE_SECONDS = int(os.getenv("BRIDGE_KEEP_ALIVE", 75)) # Matches nginx/aiohttp-style long-lived pools
 SYMBOL = "FX Vol 20" 
+DEAL_PUSH_INTERVAL = 0.1 # Seconds between the shared history scans behind /ws/deals and /deals/stream
+DEAL_PUSH_IDLE_MAX = 0.5 # Scan interval stretches up to this while no new deals show up
+DEAL_PUSH_MAX_BACKOFF = 4.0 # Cap for the scan interval while history reads keep failing
+DEAL_QUEUE_MAX = 100 # Batches buffered per push subscriber before it is sent back to history
+DEAL_LOOKBACK_WINDOWS = (60, 3600, 86400, 7 * 86400, 30 * 86400) # Ever wider scans for the newest deal when a feed starts
+DEAL_CATCH_UP_SLACK = 86400 # Extra catch-up reach: deal times are trade-server time, which may be offset from ours
 
 class TradeSignal(BaseModel):
     action: str
@@ -29,24 +43,25 @@ class TradeSignal(BaseModel):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    print("\n--- Bridge Startup ---")
+    setup_queue_logging()
+    logger.info("--- Bridge Startup ---")
+    _symbol_specs.clear()
     if not mt5.initialize(path=PATH):
         if not mt5.initialize(): 
-            print("❌ Critical: Connection failed.")
+            logger.critical("❌ Critical: Connection failed.")
     
     if mt5.login(LOGIN, password=PASSWORD, server=SERVER):
-        print(f"✅ Login successful: {LOGIN} on {SERVER}")
+        logger.info("✅ Login successful: %s on %s", LOGIN, SERVER)
     else:
-        print(f"❌ Login failed: {mt5.last_error()}")
+        logger.error("❌ Login failed: %s", mt5.last_error())
     
     if not mt5.symbol_select(SYMBOL, True):
-        print(f"⚠️ Warning: Failed to select {SYMBOL}")
+        logger.warning("⚠️ Warning: Failed to select %s", SYMBOL)
         
-    print("----------------------\n")
     yield 
-    print("\n--- Bridge Shutdown ---")
+    logger.info("--- Bridge Shutdown ---")
     mt5.shutdown()
-    print("-----------------------")
+    stop_queue_logging()
 
 app = FastAPI(title="MT5 Bridge", lifespan=lifespan)
 
@@ -60,49 +75,65 @@ def normalize_price(price, tick_size):
     formatted_price = f"{rounded_price:.{decimal_places}f}"
     return float(formatted_price)
 
+# Instrument constants (point, tick size, stops level) latched on first use per symbol
+_symbol_specs = {}
+
+def get_symbol_specs(symbol):
+    """Returns (point, trade_tick_size, trade_stops_level), hitting MT5 only once per symbol."""
+    specs = _symbol_specs.get(symbol)
+    if specs is None:
+        symbol_info = mt5.symbol_info(symbol)
+        if not symbol_info: return None
+        specs = (symbol_info.point, symbol_info.trade_tick_size, symbol_info.trade_stops_level)
+        _symbol_specs[symbol] = specs
+    return specs
+
+# Signal action -> (order type, trade action, is buy side); built once, not per request
+ACTION_MAP = {
+    "buy": (mt5.ORDER_TYPE_BUY, mt5.TRADE_ACTION_DEAL, True),
+    "sell": (mt5.ORDER_TYPE_SELL, mt5.TRADE_ACTION_DEAL, False),
+    "buy_stop": (mt5.ORDER_TYPE_BUY_STOP, mt5.TRADE_ACTION_PENDING, True),
+    "sell_stop": (mt5.ORDER_TYPE_SELL_STOP, mt5.TRADE_ACTION_PENDING, False),
+}
+
 # CRITICAL: Removed 'async' to force ThreadPool execution for blocking MT5 calls
 @app.post("/execute_signal")
-def execute_trade(signal: TradeSignal):
+def execute_trade(signal: TradeSignal) -> dict:
     try:
         if not mt5.terminal_info(): raise HTTPException(500, "MT5 Disconnected")
 
-        symbol_info = mt5.symbol_info(signal.symbol)
-        if not symbol_info: raise HTTPException(400, "Symbol not found")
+        specs = get_symbol_specs(signal.symbol)
+        if not specs: raise HTTPException(400, "Symbol not found")
 
-        tick_size = symbol_info.trade_tick_size
-        point = symbol_info.point
+        point, tick_size, stops_level = specs
         
         # Calculate Min Distance
-        min_stop_distance_price = symbol_info.trade_stops_level * point
+        min_stop_distance_price = stops_level * point
         safety_buffer_price = 5 * point
         min_allowed_distance = min_stop_distance_price + safety_buffer_price
         
-        action_map = {
-            "buy": mt5.ORDER_TYPE_BUY, "sell": mt5.ORDER_TYPE_SELL,
-            "buy_stop": mt5.ORDER_TYPE_BUY_STOP, "sell_stop": mt5.ORDER_TYPE_SELL_STOP
-        }
-        order_type = action_map.get(signal.action.lower())
+        spec = ACTION_MAP.get(signal.action.lower())
+        if not spec: raise HTTPException(400, f"Unknown action: {signal.action}")
+        order_type, trade_action, is_buy = spec
         
         # Get Price
-        if "stop" in signal.action.lower():
+        if trade_action == mt5.TRADE_ACTION_PENDING:
             raw_price = signal.price
-            trade_action = mt5.TRADE_ACTION_PENDING
         else:
             tick = mt5.symbol_info_tick(signal.symbol)
-            raw_price = tick.ask if signal.action.lower() == "buy" else tick.bid
-            trade_action = mt5.TRADE_ACTION_DEAL
+            raw_price = tick.ask if is_buy else tick.bid
 
         price = normalize_price(raw_price, tick_size)
 
         # SL/TP Clamping
         if signal.sl_points > 0:
             final_sl_distance = max(signal.sl_points, min_allowed_distance)
-            sl = price - final_sl_distance if "buy" in signal.action.lower() else price + final_sl_distance
+            sl = price - final_sl_distance if is_buy else price + final_sl_distance
         else: sl = 0.0
             
         if signal.tp_points > 0:
             final_tp_distance = max(signal.tp_points, min_allowed_distance)
-            tp = price + final_tp_distance if "buy" in signal.action.lower() else price - final_tp_distance
+            tp = price + final_tp_distance if is_buy else price - final_tp_distance
         else: tp = 0.0
 
         sl = normalize_price(sl, tick_size) if sl != 0.0 else 0.0
@@ -122,23 +153,25 @@ def execute_trade(signal: TradeSignal):
             "type_time": mt5.ORDER_TIME_GTC,
         }
 
-        print(f"📡 Sending: {signal.action} @ {price} | SL: {sl} | TP: {tp}")
+        logger.debug("📡 Sending: %s @ %s | SL: %s | TP: %s", signal.action, price, sl, tp)
         result = mt5.order_send(request)
         
         if result is None or result.retcode != mt5.TRADE_RETCODE_DONE:
             error_msg = result.comment if result else "Unknown"
-            print(f"❌ Order Failed: {error_msg} ({result.retcode if result else '?'})")
+            logger.error("❌ Order Failed: %s (%s)", error_msg, result.retcode if result else '?')
             raise HTTPException(500, f"MT5 Error: {error_msg}")
 
-        print(f"✅ ORDER SENT: {signal.action} @ {price}")
+        logger.info("✅ ORDER SENT: %s @ %s", signal.action, price)
         return {"order_id": result.order, "price": result.price}
 
+    except HTTPException:
+        raise # Already carries the right status (e.g. 400 for an unknown symbol)
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("❌ Execute failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/cancel_orders")
-def cancel_pending_orders():
+def cancel_pending_orders() -> dict:
     if not mt5.terminal_info(): return {"error": "Disconnected"}
     orders = mt5.orders_get(symbol=SYMBOL)
     count = 0
@@ -150,13 +183,15 @@ def cancel_pending_orders():
     return {"canceled": count}
 
 @app.post("/close_all")
-def close_all_positions():
+def close_all_positions() -> dict:
     cancel_pending_orders() 
     positions = mt5.positions_get(symbol=SYMBOL)
     count = 0
     if positions:
+        # One quote for the whole batch (all SYMBOL); deviation absorbs drift
+        tick = mt5.symbol_info_tick(SYMBOL)
+        if not tick: return {"closed": 0}
         for pos in positions:
-            tick = mt5.symbol_info_tick(pos.symbol)
             price = tick.bid if pos.type == mt5.ORDER_TYPE_BUY else tick.ask
             type_op = mt5.ORDER_TYPE_SELL if pos.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
             
@@ -174,12 +209,12 @@ def close_all_positions():
     return {"closed": count}
 
 @app.get("/account_info")
-def get_account_info():
+def get_account_info() -> dict:
     if not mt5.terminal_info(): return {"status": "disconnected"}
     account = mt5.account_info()
     positions = mt5.positions_get(symbol=SYMBOL)
     tick = mt5.symbol_info_tick(SYMBOL)
-    symbol_info = mt5.symbol_info(SYMBOL)
+    specs = get_symbol_specs(SYMBOL)
     
     return {
         "balance": account.balance,
@@ -187,16 +222,233 @@ def get_account_info():
         "positions_count": len(positions) if positions else 0,
         "current_price": tick.ask if tick else 0,
         "symbol": SYMBOL,
-        "point": symbol_info.point if symbol_info else 0.001 
+        "point": specs[0] if specs else 0.001 
     }
 
-@app.get("/recent_deals")
-def get_recent_deals(seconds: int = 60):
-    if not mt5.terminal_info(): return []
+def deals_since(since_ticket, seconds=60, limit=0):
+    """
+    Returns deals newer than `since_ticket` plus the highest ticket seen and
+    whether any of them closed in profit (TP) or loss (SL), all from a single
+    pass, so clients neither scan for the watermark nor re-scan for hits.
+    With `limit`, only the oldest `limit` new deals are returned and
+    max_ticket stops at the last of them, so the next call pages forward.
+    """
+    if not mt5.terminal_info():
+        return {"max_ticket": since_ticket, "tp_hit": False, "sl_hit": False, "deals": []}
     from datetime import datetime, timedelta
-    d = mt5.history_deals_get(datetime.now() - timedelta(seconds=seconds), datetime.now())
-    if not d: return []
-    return [{"ticket": x.ticket, "type": x.type, "profit": x.profit, "entry": x.entry} for x in d if x.symbol == SYMBOL]
+    now = datetime.now()
+    d = mt5.history_deals_get(now - timedelta(seconds=seconds), now)
+    max_ticket = since_ticket
+    tp_hit = sl_hit = False
+    deals = []
+    if d:
+        for x in d:
+            if x.symbol != SYMBOL or x.ticket <= since_ticket: continue
+            profit = x.profit
+            deals.append({"ticket": x.ticket, "type": x.type, "profit": profit, "entry": x.entry})
+            if x.ticket > max_ticket: max_ticket = x.ticket
+            if profit > 0: tp_hit = True
+            elif profit < 0: sl_hit = True
+            if len(deals) == limit: break # history is in time order: the rest are newer
+    return {"max_ticket": max_ticket, "tp_hit": tp_hit, "sl_hit": sl_hit, "deals": deals}
+
+def latest_deal_ticket():
+    """
+    Ticket of the newest deal, scanning ever wider windows so a quiet spell
+    doesn't hide it; 0 if there is none within the widest window.
+    """
+    for seconds in DEAL_LOOKBACK_WINDOWS:
+        ticket = deals_since(0, seconds)["max_ticket"]
+        if ticket: return ticket
+    return 0
+
+def deals_after(ticket):
+    """
+    deals_since() over a window reaching back past `ticket`'s own deal, so a
+    catch-up from an old cursor sees every deal since, not just the last 60s.
+    Without a deal to measure from it reaches back as far as
+    latest_deal_ticket() looks, which covers everything after a 0 cursor.
+    """
+    seconds = DEAL_LOOKBACK_WINDOWS[-1]
+    if ticket and mt5.terminal_info():
+        d = mt5.history_deals_get(ticket=ticket)
+        if d: seconds = max(int(time.time() - d[0].time), 0) + DEAL_CATCH_UP_SLACK
+    return deals_since(ticket, seconds)
+
+@app.get("/recent_deals")
+def get_recent_deals(request: Request, response: Response, seconds: int = 60, since_ticket: int = 0, limit: int = 0) -> dict:
+    """
+    Tagged with the watermark and deal count, so pollers sending If-None-Match
+    get an empty 304 while nothing has changed instead of the same body again.
+    """
+    result = deals_since(since_ticket, seconds, limit)
+    etag = f'W/"{result["max_ticket"]}-{len(result["deals"])}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return result
+
+class DealHub:
+    """
+    Runs the one history-scan loop behind /ws/deals and /deals/stream and
+    fans each batch out to every subscriber's queue, so N clients cost one
+    deals_since() per interval instead of N. The loop starts with the first
+    subscriber and stops with the last.
+    """
+    def __init__(self):
+        self.last_ticket = 0
+        self._subscribers = set()
+        self._task = None
+        self._lock = asyncio.Lock()
+
+    async def subscribe(self):
+        queue = asyncio.Queue(maxsize=DEAL_QUEUE_MAX)
+        async with self._lock:
+            if self._task is None:
+                # Watermark is taken before any subscriber catches up, so nothing
+                # falls between a subscriber's catch-up scan and the first push
+                self.last_ticket = await asyncio.to_thread(latest_deal_ticket)
+                self._task = asyncio.create_task(self._run())
+            # Only registered once nothing above can fail or be cancelled, so
+            # callers own the queue (and its unsubscribe) from here on
+            self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        interval = DEAL_PUSH_INTERVAL
+        scanned_at = time.monotonic()
+        while True:
+            # The window also covers any time spent failing, so an outage drops nothing
+            seconds = 60 + int(time.monotonic() - scanned_at)
+            try:
+                batch = await asyncio.to_thread(self._scan, seconds)
+            except Exception as e:
+                # Terminal hiccup: back off instead of hammering it (or dropping the streams)
+                interval = min(interval * 2, DEAL_PUSH_MAX_BACKOFF)
+                logger.warning("⚠️ Deal scan failed (%s); retrying in %.1fs", e, interval)
+            else:
+                scanned_at = time.monotonic()
+                if batch["deals"]:
+                    # Deals come in bursts (fill, then TP/SL): stay fast right after one
+                    interval = DEAL_PUSH_INTERVAL
+                    self.last_ticket = batch["max_ticket"]
+                    self._publish(batch)
+                else:
+                    interval = min(max(interval, DEAL_PUSH_INTERVAL) * 1.5, DEAL_PUSH_IDLE_MAX)
+            await asyncio.sleep(interval)
+
+    def _scan(self, seconds):
+        # deals_since() reads a dropped terminal as "no deals"; here that must
+        # count as a failed scan, or the outage would fall outside the window
+        if not mt5.terminal_info():
+            raise ConnectionError("terminal not connected")
+        return deals_since(self.last_ticket, seconds)
+
+    def _publish(self, batch):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(batch)
+            except asyncio.QueueFull:
+                # Slow consumer: drop its backlog and have it re-read history
+                # from its own cursor (None), instead of buffering without bound
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(None)
+
+deal_hub = DealHub()
+
+def _batch_after(batch, last_ticket):
+    """Trims a shared batch to the deals a subscriber hasn't seen yet."""
+    deals = [d for d in batch["deals"] if d["ticket"] > last_ticket]
+    if len(deals) == len(batch["deals"]):
+        return batch
+    return {"max_ticket": max((d["ticket"] for d in deals), default=last_ticket),
+            "tp_hit": any(d["profit"] > 0 for d in deals),
+            "sl_hit": any(d["profit"] < 0 for d in deals),
+            "deals": deals}
+
+async def _next_batch(queue, last_ticket):
+    """Waits for the next hub batch, trimmed to deals after last_ticket."""
+    batch = await queue.get()
+    if batch is None: # backlog was dropped: catch up from history instead
+        return await asyncio.to_thread(deals_after, last_ticket)
+    return _batch_after(batch, last_ticket)
+
+async def deal_batches(since_ticket):
+    """
+    Yields the watermark ({"last_ticket": N}) and then every batch of new deals.
+    N is the caller's since_ticket, or the newest deal's ticket when connecting
+    fresh, so clients bootstrap without a separate /recent_deals scan. N is
+    null when there is no deal in the last DEAL_LOOKBACK_WINDOWS[-1] seconds:
+    that is not a cursor, the feed simply starts from the next deal.
+    MT5 has no deal callback; the scanning itself is shared through deal_hub.
+    """
+    queue = await deal_hub.subscribe()
+    try:
+        last_ticket = since_ticket or deal_hub.last_ticket
+        yield {"last_ticket": last_ticket or None}
+        if since_ticket:
+            # Catch up on what happened before the hub's watermark
+            batch = await asyncio.to_thread(deals_after, last_ticket)
+            if batch["deals"]:
+                last_ticket = batch["max_ticket"]
+                yield batch
+        while True:
+            batch = await _next_batch(queue, last_ticket)
+            if batch["deals"]:
+                last_ticket = batch["max_ticket"]
+                yield batch
+    finally:
+        deal_hub.unsubscribe(queue)
+
+async def _push_deals(ws, since_ticket):
+    # aclosing: the generator's finally (unsubscribe) runs as soon as we stop
+    async with aclosing(deal_batches(since_ticket)) as frames:
+        async for frame in frames:
+            await ws.send_text(orjson.dumps(frame).decode())
+
+async def _wait_for_disconnect(ws):
+    while True:
+        message = await ws.receive()
+        if message["type"] == "websocket.disconnect": return
+
+@app.websocket("/ws/deals")
+async def stream_deals(ws: WebSocket, since_ticket: int = 0):
+    """
+    Pushes new deals as they appear; /recent_deals stays for resync. The feed
+    only sends, so a concurrent receive() is what notices a client leaving
+    (or server shutdown) while the market is quiet, rather than the next send.
+    """
+    await ws.accept()
+    tasks = {asyncio.create_task(_push_deals(ws, since_ticket)),
+             asyncio.create_task(_wait_for_disconnect(ws))}
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks: task.cancel()
+        # wait(), not gather(): gather re-raises a cancellation without the
+        # canceller's message, so an anyio cancel scope wouldn't recognise it
+        await asyncio.wait(tasks)
+    for task in tasks:
+        error = None if task.cancelled() else task.exception()
+        if error and not isinstance(error, WebSocketDisconnect):
+            logger.error("❌ Deal stream failed: %s", error)
+
+@app.get("/deals/stream")
+async def stream_deals_sse(since_ticket: int = 0):
+    """Same push feed as /ws/deals as text/event-stream, for plain HTTP clients."""
+    async def events():
+        async with aclosing(deal_batches(since_ticket)) as frames:
+            async for frame in frames:
+                yield b"data: " + orjson.dumps(frame) + b"\n\n"
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=BRIDGE_PORT)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=BRIDGE_PORT, timeout_keep_alive=KEEP_ALIVE_SECONDS)
\ No newline at end of file
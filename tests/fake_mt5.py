@@ -0,0 +1,50 @@
+"""Minimal in-memory stand-in for the MetaTrader5 package, for tests (the real one needs a terminal)."""
+import time
+from types import SimpleNamespace
+
+TRADE_ACTION_DEAL = 1
+TRADE_ACTION_PENDING = 5
+TRADE_ACTION_REMOVE = 8
+ORDER_TYPE_BUY = 0
+ORDER_TYPE_SELL = 1
+ORDER_TYPE_BUY_STOP = 4
+ORDER_TYPE_SELL_STOP = 5
+ORDER_TIME_GTC = 0
+TRADE_RETCODE_DONE = 10009
+
+deals = [] # history, oldest first
+positions = []
+orders = []
+sent = []
+
+def reset():
+    deals.clear(); positions.clear(); orders.clear(); sent.clear()
+
+def add_deal(ticket, profit=0.0, symbol="FX Vol 20", type=0, entry=1, age=0.0):
+    deals.append(SimpleNamespace(ticket=ticket, profit=profit, symbol=symbol, type=type, entry=entry,
+                                 time=int(time.time() - age)))
+
+def initialize(*args, **kwargs): return True
+def login(*args, **kwargs): return True
+def shutdown(): pass
+def last_error(): return (0, "ok")
+def terminal_info(): return SimpleNamespace(connected=True)
+def symbol_select(symbol, enable=True): return True
+def symbol_info(symbol): return SimpleNamespace(point=0.01, trade_tick_size=0.01, trade_stops_level=0)
+def symbol_info_tick(symbol): return SimpleNamespace(ask=100.0, bid=99.0, time_msc=1)
+def account_info(): return SimpleNamespace(balance=1000.0, equity=1000.0, profit=0.0)
+def positions_get(symbol=None): return tuple(positions)
+def orders_get(symbol=None): return tuple(orders)
+
+def order_send(request):
+    sent.append(dict(request))
+    return SimpleNamespace(retcode=TRADE_RETCODE_DONE, order=len(sent), price=request.get("price", 0), comment="done")
+
+def _ts(value):
+    return value if isinstance(value, (int, float)) else value.timestamp()
+
+def history_deals_get(date_from=None, date_to=None, ticket=None, **kwargs):
+    if ticket is not None:
+        return tuple(d for d in deals if d.ticket == ticket)
+    lo, hi = _ts(date_from), _ts(date_to)
+    return tuple(d for d in deals if lo <= d.time <= hi)
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import sys
+from contextlib import aclosing
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import fake_mt5
+sys.modules["MetaTrader5"] = fake_mt5 # the real package needs a running terminal
+
+import mt5_bridge
+
+client = TestClient(mt5_bridge.app)
+
+def setup_function():
+    fake_mt5.reset()
+
+def test_recent_deals_etag_304():
+    fake_mt5.add_deal(5, profit=1.0)
+    first = client.get("/recent_deals")
+    assert first.status_code == 200
+    assert first.json()["max_ticket"] == 5
+
+    etag = first.headers["etag"]
+    unchanged = client.get("/recent_deals", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.content == b""
+    assert unchanged.headers["etag"] == etag
+
+    fake_mt5.add_deal(6, profit=-1.0)
+    changed = client.get("/recent_deals", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json()["max_ticket"] == 6
+    assert changed.headers["etag"] != etag
+
+@pytest.fixture
+def hub(monkeypatch):
+    hub = mt5_bridge.DealHub()
+    monkeypatch.setattr(mt5_bridge, "deal_hub", hub)
+    return hub
+
+def first_frames(since_ticket, count):
+    async def run():
+        frames = []
+        async with aclosing(mt5_bridge.deal_batches(since_ticket)) as batches:
+            async for frame in batches:
+                frames.append(frame)
+                if len(frames) == count:
+                    return frames
+    return asyncio.run(run())
+
+def test_hello_is_newest_deal_even_when_quiet(hub):
+    fake_mt5.add_deal(7, age=7200) # outside the default 60s window
+    assert first_frames(0, 1) == [{"last_ticket": 7}]
+
+def test_hello_is_null_without_deals(hub):
+    assert first_frames(0, 1) == [{"last_ticket": None}]
+
+def test_catch_up_reaches_back_to_the_cursor(hub):
+    fake_mt5.add_deal(1, age=7200)
+    fake_mt5.add_deal(2, profit=1.0, age=3600)
+    hello, batch = first_frames(1, 2)
+    assert hello == {"last_ticket": 1}
+    assert [d["ticket"] for d in batch["deals"]] == [2]
+    assert batch["tp_hit"]
+
+def test_failed_subscribe_leaves_nothing_behind(hub, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("terminal gone")
+    monkeypatch.setattr(fake_mt5, "history_deals_get", broken)
+    with pytest.raises(RuntimeError):
+        asyncio.run(hub.subscribe())
+    assert not hub._subscribers
+    assert hub._task is None
+
+def test_scan_stops_with_last_subscriber(hub):
+    async def run():
+        first = await hub.subscribe()
+        second = await hub.subscribe()
+        task = hub._task
+        hub.unsubscribe(first)
+        assert hub._task is task and not task.cancelled()
+        hub.unsubscribe(second)
+        assert hub._task is None
+        await asyncio.gather(task, return_exceptions=True)
+        assert task.cancelled()
+    asyncio.run(run())
+
+def test_overflow_catches_up_from_history(hub, monkeypatch):
+    monkeypatch.setattr(mt5_bridge, "DEAL_QUEUE_MAX", 2)
+    fake_mt5.add_deal(10, age=600)
+    for ticket in (11, 12, 13):
+        fake_mt5.add_deal(ticket, age=300) # older than 60s by the time it is read
+
+    async def run():
+        queue = await hub.subscribe()
+        try:
+            for ticket in (11, 12, 13):
+                deal = {"ticket": ticket, "type": 0, "profit": 0.0, "entry": 1}
+                hub._publish({"max_ticket": ticket, "tp_hit": False, "sl_hit": False, "deals": [deal]})
+            assert queue.qsize() == 1 # backlog dropped for a catch-up marker
+            return await mt5_bridge._next_batch(queue, 10)
+        finally:
+            hub.unsubscribe(queue)
+
+    batch = asyncio.run(run())
+    assert [d["ticket"] for d in batch["deals"]] == [11, 12, 13]
+
+def test_websocket_disconnect_unsubscribes(hub):
+    fake_mt5.add_deal(3)
+    with client.websocket_connect("/ws/deals") as ws:
+        assert ws.receive_json() == {"last_ticket": 3}
+        assert len(hub._subscribers) == 1
+    assert not hub._subscribers
+    assert hub._task is None
+
+def test_scan_treats_a_dropped_terminal_as_a_failure(hub, monkeypatch):
+    monkeypatch.setattr(fake_mt5, "terminal_info", lambda: None)
+    with pytest.raises(ConnectionError):
+        hub._scan(60)
@@ -0,0 +1,28 @@
+import json
+import os
+import sys
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.config_manager import ConfigManager
+
+def write(path, text, mtime_ns):
+    with open(path, "w") as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns)) # distinct mtimes even on coarse filesystems
+
+def test_bad_reload_keeps_last_good_config(tmp_path):
+    path = str(tmp_path / "config.json")
+    write(path, json.dumps({"symbol": "A"}), 1_000_000_000)
+    manager = ConfigManager(config_file=path)
+    manager.check_interval = 0
+    version = manager.get_version()
+
+    write(path, '{"symbol": "B"', 2_000_000_000) # half-saved edit
+    assert manager.get_version() == version
+    assert manager.get_config() == {"symbol": "A"}
+
+    write(path, json.dumps({"symbol": "B"}), 2_000_000_000) # same mtime, now complete
+    assert manager.get_version() == version + 1
+    assert manager.get_config() == {"symbol": "B"}
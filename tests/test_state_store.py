@@ -0,0 +1,76 @@
+import asyncio
+import os
+import sys
+import time
+
+import orjson
+import pytest
+
+# Add project root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import state_store
+from core.state_store import StateWriter, write_state_file
+
+def read(path):
+    with open(path, "rb") as f:
+        return orjson.loads(f.read())
+
+def test_write_replaces_atomically(tmp_path):
+    path = str(tmp_path / "bot_state.json")
+    write_state_file(path, {"step": 1})
+    write_state_file(path, {"step": 2})
+    assert read(path) == {"step": 2}
+    assert os.listdir(tmp_path) == ["bot_state.json"] # no temp files left behind
+
+def test_failed_write_keeps_previous_state(tmp_path, monkeypatch):
+    path = str(tmp_path / "bot_state.json")
+    write_state_file(path, {"step": 1})
+
+    def broken_replace(src, dst):
+        raise OSError("disk gone")
+    monkeypatch.setattr(state_store.os, "replace", broken_replace)
+    with pytest.raises(OSError):
+        write_state_file(path, {"step": 2})
+    assert read(path) == {"step": 1}
+    assert os.listdir(tmp_path) == ["bot_state.json"]
+
+def test_requests_coalesce_into_latest(tmp_path, monkeypatch):
+    path = str(tmp_path / "bot_state.json")
+    written = []
+
+    def recording_write(p, state):
+        written.append(state["step"])
+        write_state_file(p, state)
+    monkeypatch.setattr(state_store, "write_state_file", recording_write)
+
+    async def run():
+        writer = StateWriter(path)
+        for step in range(5):
+            writer.request({"step": step}) # all before the writer task gets to run
+        await writer.save({"step": 5})
+
+    asyncio.run(run())
+    assert written == [5]
+    assert read(path) == {"step": 5}
+
+def test_save_lands_after_in_flight_write(tmp_path, monkeypatch):
+    path = str(tmp_path / "bot_state.json")
+    written = []
+
+    def slow_write(p, state):
+        if state["step"] == 1:
+            time.sleep(0.05) # still writing when the final save is requested
+        written.append(state["step"])
+        write_state_file(p, state)
+    monkeypatch.setattr(state_store, "write_state_file", slow_write)
+
+    async def run():
+        writer = StateWriter(path)
+        writer.request({"step": 1})
+        await asyncio.sleep(0.01)
+        await writer.save({"step": 2})
+
+    asyncio.run(run())
+    assert written == [1, 2]
+    assert read(path) == {"step": 2}